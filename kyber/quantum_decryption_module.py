@@ -9,13 +9,20 @@ Security Fixes:
 """
 
 import os
+import sys
+from hashlib import sha256
+import mmap
 import ctypes
-import json
+import struct
 import time
+import json
 import base64
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import HKDF
-from Crypto.Hash import SHA256
+import contextlib
+import binascii
+from array import array
+from typing import Optional
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # OpenSSL EVP: stitched AES-NI + PCLMULQDQ
 
 # --- CONSTANTS ---
 AES_KEY_SIZE = 32
@@ -25,27 +32,164 @@ FIXED_PAYLOAD_SIZE = 512
 HKDF_INFO = b"AES-GCM-256-ZERO-METADATA"
 RATCHET_INFO_CHAIN = b"RATCHET-CHAIN-KEY"
 RATCHET_INFO_MSG = b"RATCHET-MESSAGE-KEY"
+HKDF_ZERO_SALT = b"\x00" * 32  # HKDF salt=None for SHA256
+LOOKUP_INFO = b"MESSAGE-LOOKUP-ID"
+# HKDF-Expand input for a single 32-byte block: info || 0x01
+_HKDF_MSG = RATCHET_INFO_MSG + b"\x01"
+_HKDF_CHAIN = RATCHET_INFO_CHAIN + b"\x01"
+_HKDF_AESKEY = HKDF_INFO + b"\x01"
+_HKDF_LOOKUP = LOOKUP_INFO + b"\x01"
+# Hidden header: sender_len(1) + sender_id(16, zero padded) + seq(8) + timestamp(8) + message_id(8)
+HEADER = struct.Struct(">B16sQQ8s")
+FRAME = struct.Struct("<I")  # --binary mode: little-endian length prefix per package
+FRAME_OK, FRAME_ERROR = 0, 1  # --binary mode: status byte leading every output frame
+PACKAGE_SIZE = 16 + NONCE_SIZE + TAG_SIZE + FIXED_PAYLOAD_SIZE  # LookupID + Nonce + Tag + Ciphertext
 
 def secure_wipe(data: bytes):
-    """Overwrites sensitive memory."""
-    if not isinstance(data, (bytes, bytearray)) or len(data) == 0: return
-    try:
-        if isinstance(data, bytearray):
-            ctypes.memset(ctypes.addressof(ctypes.c_char.from_buffer(data)), 0, len(data))
-    except Exception: pass
+    """Overwrites sensitive memory.
+    Same-length slice assignment zeroes the buffer in place (one memcpy, no ctypes round trip)."""
+    if type(data) in (bytearray, mmap.mmap) and len(data):
+        data[:] = bytes(len(data))
+
+# libc is loaded once; None where mlock/munlock are unavailable
+try:
+    _LIBC = ctypes.CDLL(None, use_errno=True)
+    _LIBC.mlock.argtypes = _LIBC.munlock.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+except (OSError, AttributeError):
+    _LIBC = None
+
+def _buffer_address(buf) -> int:
+    ref = ctypes.c_char.from_buffer(buf)
+    addr = ctypes.addressof(ref)
+    del ref # drop the export again so the mapping can be closed later
+    return addr
+
+def locked_buffer(size: int):
+    """Returns (buf, locked): a zeroed anonymous mapping for a long-lived key arena.
+    The mapping owns its pages, so mlock and MADV_DONTDUMP never cover unrelated heap objects.
+    locked is False when mlock is refused (e.g. RLIMIT_MEMLOCK); the buffer works either way."""
+    buf = mmap.mmap(-1, size)
+    try: buf.madvise(mmap.MADV_DONTDUMP)
+    except (AttributeError, OSError): pass
+    locked = _LIBC is not None and _LIBC.mlock(_buffer_address(buf), size) == 0
+    return buf, locked
+
+def release_buffer(buf, locked: bool):
+    """Wipes, munlocks and unmaps a locked_buffer()."""
+    if buf.closed: return
+    secure_wipe(buf)
+    if locked: _LIBC.munlock(_buffer_address(buf), len(buf))
+    buf.close()
+
+# --- HKDF/HMAC block: must stay identical to the copy in quantum_encryption_module.py ---
+# HMAC-SHA256 (RFC 2104) is built directly on sha256: every HMAC key in the ladder is a 32-byte
+# PRK, so key XOR ipad/opad is key.translate(table) into a bytearray, absorbed into a sha256 state
+# together with the fill and wiped straight away. Each Expand copies the keyed states.
+_DIGEST_SIZE = sha256().digest_size  # 32: HMAC keys are SHA-256 PRKs, one digest long
+_BLOCK_SIZE = sha256().block_size  # 64
+_IPAD = bytes(b ^ 0x36 for b in range(256))
+_OPAD = bytes(b ^ 0x5C for b in range(256))
+_IPAD_FILL = b"\x36" * (_BLOCK_SIZE - _DIGEST_SIZE)  # ipad over the zero-padded key tail
+_OPAD_FILL = b"\x5c" * (_BLOCK_SIZE - _DIGEST_SIZE)
+# HKDF-Extract always keys HMAC with the zero salt: both pad states are constant, copy per use
+_EXTRACT_INNER = sha256(HKDF_ZERO_SALT.translate(_IPAD) + _IPAD_FILL)
+_EXTRACT_OUTER = sha256(HKDF_ZERO_SALT.translate(_OPAD) + _OPAD_FILL)
+
+def hkdf_extract(ikm: bytes) -> bytes:
+    """HKDF-Extract with salt=None, reusing the precomputed ipad/opad states."""
+    inner = _EXTRACT_INNER.copy()
+    inner.update(ikm)
+    outer = _EXTRACT_OUTER.copy()
+    outer.update(inner.digest())
+    return outer.digest()
 
-def trial_decrypt(msg_key: bytes, package: bytes) -> bytes:
-    """Attempts to decrypt the opaque package using the candidate message key."""
-    nonce = package[:NONCE_SIZE]
-    tag = package[NONCE_SIZE:NONCE_SIZE+TAG_SIZE]
-    ciphertext = package[NONCE_SIZE+TAG_SIZE:]
+def expand_pads(prk: bytes):
+    """Returns the keyed (inner, outer) sha256 states of a 32-byte PRK, shared by every Expand under it.
+    The key XOR pad blocks only ever exist as bytearrays and are wiped before returning.
+    The fills assume a digest-sized key, so any other length is rejected."""
+    if len(prk) != _DIGEST_SIZE: raise ValueError(f"HMAC key must be {_DIGEST_SIZE} bytes")
+    key = prk if type(prk) is bytearray else bytearray(prk)
+    pad = key.translate(_IPAD)
+    inner = sha256(pad)
+    inner.update(_IPAD_FILL)
+    secure_wipe(pad)
+    pad = key.translate(_OPAD)
+    outer = sha256(pad)
+    outer.update(_OPAD_FILL)
+    secure_wipe(pad)
+    if key is not prk: secure_wipe(key)
+    return inner, outer
+
+def hkdf_expand(pads, info_block: bytes) -> bytes:
+    """First HKDF-Expand block T(1) = HMAC(prk, info || 0x01), from expand_pads(prk)."""
+    inner, outer = pads
+    inner = inner.copy()
+    inner.update(info_block)
+    outer = outer.copy()
+    outer.update(inner.digest())
+    return outer.digest()
+
+def kdf(key: bytes, context: bytes, out: int = AES_KEY_SIZE) -> bytes:
+    """Single-output key derivation (HKDF-SHA256, no salt, out <= 32 so one Expand block).
+    Must stay in sync with hkdfDerive() in src/lib/crypto.ts."""
+    prk = bytearray(hkdf_extract(key))
+    okm = hkdf_expand(expand_pads(prk), context + b"\x01")[:out]
+    secure_wipe(prk)
+    return okm
+# --- end of HKDF/HMAC block ---
+
+def ratchet_window(chain_key: bytes, n: int, msg_keys: bool = True):
+    """Runs n ratchet steps in one tight loop: returns (final_chain_key, [msg_key_1..msg_key_n]),
+    or only the final chain key when msg_keys is False (the message Expand is skipped).
+    Same keys as n single HKDF ratchet steps, with the hot names hoisted out of the loop."""
+    extract_inner = _EXTRACT_INNER.copy
+    extract_outer = _EXTRACT_OUTER.copy
+    keyed = expand_pads
+    keys = []
+    prk = bytearray(AES_KEY_SIZE) # one scratch buffer, overwritten each step and wiped once
+    for _ in range(n):
+        inner = extract_inner()
+        inner.update(chain_key)
+        outer = extract_outer()
+        outer.update(inner.digest())
+        prk[:] = outer.digest()
+        inner, outer = keyed(prk)
+        if msg_keys:
+            msg = inner.copy()
+            msg.update(_HKDF_MSG)
+            msg_out = outer.copy()
+            msg_out.update(msg.digest())
+            keys.append(msg_out.digest())
+        inner.update(_HKDF_CHAIN)
+        outer.update(inner.digest())
+        chain_key = outer.digest()
+    secure_wipe(prk)
+    return (chain_key, keys) if msg_keys else chain_key
+
+def message_prk(msg_key: bytes) -> bytes:
+    """HKDF-Extract of a message key. The beacon and the AES key are one Expand each from here."""
+    return hkdf_extract(msg_key)
+
+def beacon_from_prk(prk: bytes) -> bytes:
+    """Same output as kdf(msg_key, LOOKUP_INFO, 16), starting from message_prk(msg_key)."""
+    return hkdf_expand(expand_pads(prk), _HKDF_LOOKUP)[:16]
+
+def gcm_decrypt(aes_key: bytes, nonce: bytes, ciphertext: bytes, tag: bytes) -> bytes:
+    """AES-256-GCM open; raises InvalidTag if the tag does not verify."""
+    return AESGCM(aes_key).decrypt(nonce, b"".join((ciphertext, tag)), None)
+
+def trial_decrypt(prk: bytes, package: bytes) -> bytes:
+    """Attempts to decrypt the opaque package under a candidate message_prk(msg_key).
+    Only the AES-key HKDF-Expand runs here; the Extract was done when the step was indexed."""
+    view = memoryview(package)
+    nonce = bytes(view[:NONCE_SIZE])
+    tag = bytes(view[NONCE_SIZE:NONCE_SIZE+TAG_SIZE])
+    ciphertext = view[NONCE_SIZE+TAG_SIZE:] # no copy of the ciphertext
     
-    aes_key = HKDF(msg_key, AES_KEY_SIZE, None, SHA256, context=HKDF_INFO)
+    aes_key = bytearray(hkdf_expand(expand_pads(prk), _HKDF_AESKEY))
     try:
-        cipher = AES.new(aes_key, AES.MODE_GCM, nonce=nonce)
-        decrypted_payload = cipher.decrypt_and_verify(ciphertext, tag)
-        return decrypted_payload
-    except Exception:
+        return gcm_decrypt(aes_key, nonce, ciphertext, tag)
+    except InvalidTag:
         return None
     finally:
         secure_wipe(aes_key)
@@ -53,62 +197,125 @@ def trial_decrypt(msg_key: bytes, package: bytes) -> bytes:
 class QuantumDoubleRatchetReceiver:
     MAX_SKIP = 100
     MAX_CACHE = 50
+    MAX_STORED_KEYS = 2000
+    __slots__ = ('_key_page', '_root_key', '_chain_key', '_step', '_keys_buf', '_key_steps', '_skipped_slots', '_next_slot',
+                 '_lookahead_buf', '_lookahead_lids', '_shadow_chain', '_shadow_step', '_lookup_cache', '_locked')
 
     def __init__(self, initial_shared_secret: bytes):
-        self._root_key = initial_shared_secret
-        self._chain_key = bytearray(initial_shared_secret)
+        # Root, chain and shadow chain key live in fixed 32-byte slots of one locked page and are
+        # only ever overwritten in place; the caller's buffer is copied, never modified
+        self._key_page, page_locked = locked_buffer(3 * AES_KEY_SIZE)
+        page = memoryview(self._key_page)
+        self._root_key = page[:AES_KEY_SIZE]
+        self._chain_key = page[AES_KEY_SIZE:2*AES_KEY_SIZE]
+        self._shadow_chain = page[2*AES_KEY_SIZE:3*AES_KEY_SIZE]
+        self._root_key[:] = initial_shared_secret
+        self._chain_key[:] = initial_shared_secret
         self._step = 0
-        self._skipped_keys = {} # {seq: key}
-        self._lookup_cache = {} # {lookup_id: (key, seq)}
+        # Skipped message PRKs: one contiguous ring buffer, oldest slot is overwritten first
+        self._keys_buf, keys_locked = locked_buffer(self.MAX_STORED_KEYS * AES_KEY_SIZE)
+        self._key_steps = array('q', [0]) * self.MAX_STORED_KEYS # {slot: seq}, 0 = free
+        self._skipped_slots = {} # {seq: slot}
+        self._next_slot = 0
+        # Lookahead PRKs share one ring arena, step s lives in slot (s - 1) % MAX_SKIP
+        self._lookahead_buf, lookahead_locked = locked_buffer(self.MAX_SKIP * AES_KEY_SIZE)
+        self._locked = (page_locked, keys_locked, lookahead_locked)
+        self._lookahead_lids = [None] * self.MAX_SKIP # {slot: lookup_id}
+        # Shadow chain: the furthest step already indexed, slid forward as messages arrive
+        self._shadow_step = self._step
+        self._lookup_cache = {} # {lookup_id: (message_prk, seq)}, message_prk is None for skipped keys
         self._refresh_lookup_cache()
 
+    def close(self):
+        """Wipes all key state and unlocks/unmaps the arenas. The receiver is unusable afterwards."""
+        self._lookup_cache.clear() # drops the views into the lookahead arena
+        self._skipped_slots.clear()
+        for view in (self._root_key, self._chain_key, self._shadow_chain):
+            view.release() # drop the slot views so the key page can be closed
+        release_buffer(self._key_page, self._locked[0])
+        release_buffer(self._keys_buf, self._locked[1])
+        release_buffer(self._lookahead_buf, self._locked[2])
+
+    def __del__(self):
+        try: self.close()
+        except Exception: pass # __init__ did not finish, or interpreter shutdown
+
+    def _store_skipped(self, seq: int, prk: bytes):
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.MAX_STORED_KEYS
+        evicted = self._key_steps[slot]
+        off = slot * AES_KEY_SIZE
+        if evicted:
+            del self._skipped_slots[evicted]
+            self._lookup_cache.pop(beacon_from_prk(memoryview(self._keys_buf)[off:off+AES_KEY_SIZE]), None)
+        self._keys_buf[off:off+AES_KEY_SIZE] = prk
+        self._key_steps[slot] = seq
+        self._skipped_slots[seq] = slot
+
+    def _take_skipped(self, seq: int) -> bytearray:
+        slot = self._skipped_slots.pop(seq)
+        off = slot * AES_KEY_SIZE
+        prk = bytearray(memoryview(self._keys_buf)[off:off+AES_KEY_SIZE])
+        self._keys_buf[off:off+AES_KEY_SIZE] = bytes(AES_KEY_SIZE)
+        self._key_steps[slot] = 0
+        return prk
+
+    def _clear_skipped(self):
+        secure_wipe(self._keys_buf)
+        key_steps = self._key_steps
+        for slot in self._skipped_slots.values(): # only occupied slots are non-zero
+            key_steps[slot] = 0
+        self._skipped_slots.clear()
+        self._next_slot = 0
+
     def _refresh_lookup_cache(self):
-        """Pre-calculates the next 100 possible message identifiers for instant lookup."""
+        """Re-seeds the shadow chain from the real chain and indexes the next 100 steps.
+        Only needed on init and root refresh; decrypt slides the window incrementally."""
         self._lookup_cache.clear()
-        
-        # 1. Index skipped keys
-        for seq, key in self._skipped_keys.items():
-            lid = HKDF(key, 16, None, SHA256, context=b"MESSAGE-LOOKUP-ID")
-            self._lookup_cache[lid] = (key, seq)
-            
-        # 2. Index next 100 keys (Lookahead)
-        temp_chain = bytearray(self._chain_key)
-        temp_step = self._step
-        for i in range(self.MAX_SKIP):
-            candidate_key = HKDF(temp_chain, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_MSG)
-            lid = HKDF(candidate_key, 16, None, SHA256, context=b"MESSAGE-LOOKUP-ID")
-            self._lookup_cache[lid] = (candidate_key, temp_step + 1)
-            
-            # Advance shadow chain
-            next_chain = HKDF(temp_chain, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_CHAIN)
-            secure_wipe(temp_chain)
-            temp_chain = bytearray(next_chain)
-            temp_step += 1
+        self._shadow_chain[:] = self._chain_key
+        self._shadow_step = self._step
+        self._extend_lookahead()
+
+    def _extend_lookahead(self):
+        """Runs the shadow chain forward so steps up to self._step + MAX_SKIP are indexed.
+        Each new step reuses the ring slot of a step the real chain has already passed."""
+        n = self._step + self.MAX_SKIP - self._shadow_step
+        if n <= 0: return
+        new_chain, candidate_keys = ratchet_window(self._shadow_chain, n)
+        self._shadow_chain[:] = new_chain
+        # Hot names hoisted to locals for the loop
+        arena = self._lookahead_buf
+        lookahead = memoryview(arena)
+        lids, cache, max_skip = self._lookahead_lids, self._lookup_cache, self.MAX_SKIP
+        extract, beacon = message_prk, beacon_from_prk
+        for seq, candidate_key in enumerate(candidate_keys, start=self._shadow_step + 1):
+            slot = (seq - 1) % max_skip
+            off = slot * AES_KEY_SIZE
+            arena[off:off+AES_KEY_SIZE] = extract(candidate_key)
+            prk = lookahead[off:off+AES_KEY_SIZE]
+            lid = beacon(prk)
+            lids[slot] = lid
+            cache[lid] = (prk, seq)
+        self._shadow_step += n
 
     def refresh_root(self, new_entropy: bytes):
         """Advances the root key to heal the connection."""
-        new_root = HKDF(
-            master=self._root_key + new_entropy,
-            key_len=AES_KEY_SIZE,
-            salt=None,
-            hashmod=SHA256,
-            context=b"ROOT-REFRESH"
-        )
-        secure_wipe(self._chain_key)
-        self._root_key = new_root
-        self._chain_key = bytearray(new_root)
+        ikm = bytearray(self._root_key)
+        ikm += new_entropy
+        new_root = kdf(ikm, b"ROOT-REFRESH")
+        secure_wipe(ikm)
+        self._root_key[:] = new_root
+        self._chain_key[:] = new_root
         self._step = 0
-        self._skipped_keys.clear()
+        self._clear_skipped()
         self._refresh_lookup_cache()
         print(f"✨ Root Key Refreshed. Connection 'Heal' successful.")
 
-    def _advance_chain(self) -> bytes:
-        msg_key = HKDF(self._chain_key, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_MSG)
-        new_chain = HKDF(self._chain_key, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_CHAIN)
-        secure_wipe(self._chain_key)
-        self._chain_key = bytearray(new_chain)
-        self._step += 1
-        return msg_key
+    def _advance_many(self, n: int):
+        """Advances the real chain n steps in one batch. The message keys for these steps
+        are already in the lookahead arena, so only the chain Expand runs."""
+        self._chain_key[:] = ratchet_window(self._chain_key, n, msg_keys=False) # overwrite in place, no new buffer per step
+        self._step += n
 
     def decrypt(self, package: bytes) -> bytes:
         """Instant lookup using the Blinded Identifier Beacon."""
@@ -116,37 +323,56 @@ class QuantumDoubleRatchetReceiver:
 
         # 1. Extract Beacon
         beacon = package[:16]
-        crypto_blob = package[16:]
+        crypto_blob = memoryview(package)[16:]
 
         # 2. FAST LOOKUP (O(1))
-        if beacon in self._lookup_cache:
-            match_key, match_seq = self._lookup_cache[beacon]
+        entry = self._lookup_cache.get(beacon) # one probe: no separate membership test
+        if entry is not None:
+            match_key, match_seq = entry
             
             # Case A: It was a skipped key
-            if match_seq in self._skipped_keys:
-                del self._skipped_keys[match_seq]
-                res = trial_decrypt(match_key, crypto_blob)
-                self._refresh_lookup_cache()
+            if match_seq in self._skipped_slots:
+                prk = self._take_skipped(match_seq)
+                del self._lookup_cache[beacon]
+                res = trial_decrypt(prk, crypto_blob)
+                secure_wipe(prk)
                 return self._unpack(res)
             
-            # Case B: It is in the future (advance real chain)
-            while self._step < match_seq:
-                key = self._advance_chain()
-                if self._step == match_seq:
-                    res = trial_decrypt(key, crypto_blob)
-                    self._refresh_lookup_cache() # Update cache for next message
-                    return self._unpack(res)
-                else:
-                    self._skipped_keys[self._step] = key
+            # Case B: It is in the future (advance real chain in one batch)
+            if self._step < match_seq:
+                # Skipped PRKs are already in the lookahead arena: copy them, don't re-derive.
+                # Their beacons stay indexed, now pointing at the skipped-key store.
+                first_skipped = self._step + 1
+                self._advance_many(match_seq - self._step)
+                lookahead = memoryview(self._lookahead_buf)
+                for seq in range(first_skipped, match_seq):
+                    slot = (seq - 1) % self.MAX_SKIP
+                    off = slot * AES_KEY_SIZE
+                    self._store_skipped(seq, lookahead[off:off+AES_KEY_SIZE])
+                    self._lookup_cache[self._lookahead_lids[slot]] = (None, seq)
+                del self._lookup_cache[beacon]
+                res = trial_decrypt(match_key, crypto_blob)
+                self._extend_lookahead() # Slide the window: index only the newly reachable steps
+                return self._unpack(res)
 
         raise ValueError("Decryption Failure: Unknown Beacon (Identification failed)")
 
     def _unpack(self, decrypted_payload: bytes) -> bytes:
         """Parses the hidden header and message, ignoring random padding."""
+        if decrypted_payload is None: raise ValueError("Decryption Failure: Authentication tag mismatch")
         # 1. Extract Header
         h_len = int.from_bytes(decrypted_payload[:4], 'big')
-        header_bytes = decrypted_payload[4:4+h_len]
-        header = json.loads(header_bytes.decode('utf-8'))
+        if decrypted_payload[4:5] == b"{":
+            # Legacy JSON header from senders before the binary layout
+            header = json.loads(decrypted_payload[4:4+h_len].decode('utf-8'))
+            sender_id, seq, msg_id = header['s'], header['n'], header['i']
+        elif h_len == HEADER.size:
+            sender_len, sender, seq, _, raw_id = HEADER.unpack_from(decrypted_payload, 4)
+            if sender_len > len(sender): raise ValueError("Malformed hidden header")
+            sender_id = sender[:sender_len].decode('utf-8', errors='replace')
+            msg_id = raw_id.hex()
+        else:
+            raise ValueError(f"Unsupported hidden header (length {h_len})")
         
         # 2. Extract Message
         m_start = 4 + h_len
@@ -155,7 +381,7 @@ class QuantumDoubleRatchetReceiver:
         
         # Note: Everything after m_len is random padding (noise) which we discard.
         
-        print(f"📩 Decrypted from {header['s']} | Seq: {header['n']} | ID: {header['i']}")
+        print(f"📩 Decrypted from {sender_id} | Seq: {seq} | ID: {msg_id}")
         return message
 
 def smart_load_secret(input_str: str) -> bytes:
@@ -163,7 +389,7 @@ def smart_load_secret(input_str: str) -> bytes:
     input_str = input_str.strip()
     try:
         if len(input_str) == 64: # Likely Hex
-            return bytes.fromhex(input_str)
+            return binascii.unhexlify(input_str)
         # Base64 for 32 bytes is 44 characters
         if len(input_str) == 44 or input_str.endswith('='):
             decoded = base64.b64decode(input_str)
@@ -171,7 +397,55 @@ def smart_load_secret(input_str: str) -> bytes:
     except Exception: pass
     raise ValueError("Invalid Key Format. Must be 32 bytes (64 Hex or 44 Base64 chars).")
 
+def read_frame(stream) -> Optional[bytes]:
+    """Reads one [4B LE length] + [payload] input frame (input frames carry no status byte).
+    Returns None only on a clean end of stream at a frame boundary; a stream that ends inside
+    a frame raises ValueError("truncated frame")."""
+    head = stream.read(FRAME.size)
+    if not head: return None
+    if len(head) < FRAME.size: raise ValueError("truncated frame")
+    (length,) = FRAME.unpack(head)
+    payload = stream.read(length)
+    if len(payload) != length: raise ValueError("truncated frame")
+    return payload
+
+def write_frame(stream, status: int, payload: bytes):
+    """Writes one [4B LE length] + [1B status] + [payload] frame and flushes it so a wrapping process can pipeline."""
+    stream.write(FRAME.pack(len(payload) + 1) + bytes((status,)))
+    stream.write(payload)
+    stream.flush()
+
+def binary_main():
+    """--binary: the first stdin line is the shared secret, then framed packages in, framed plaintexts out.
+    No hex round trip. Every input frame gets exactly one output frame, in order: FRAME_OK + plaintext,
+    or FRAME_ERROR + UTF-8 reason (also for a truncated last frame). Human-readable status goes to stderr.
+    Input frames are [4B LE length] + [package] with no status byte: frames from the encryptor's --binary
+    output must have their [1B status] checked and stripped before they are fed in here."""
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    try:
+        shared_secret = smart_load_secret(stdin.readline().decode('ascii'))
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return
+
+    ratchet = QuantumDoubleRatchetReceiver(shared_secret)
+    with contextlib.redirect_stdout(sys.stderr):
+        while True:
+            try:
+                package = read_frame(stdin)
+                if package is None: break
+                plaintext = ratchet.decrypt(package)
+            except Exception as e:
+                print(f"❌ FAILED: {e}")
+                write_frame(stdout, FRAME_ERROR, str(e).encode('utf-8'))
+                continue
+            write_frame(stdout, FRAME_OK, plaintext)
+
 def main():
+    if "--binary" in sys.argv[1:]:
+        binary_main()
+        return
+
     print("\n" + "="*60)
     print("  🔓 QUANTUM-SAFE DECRYPTION (ZERO-METADATA)")
     print("="*60 + "\n")
@@ -194,14 +468,15 @@ def main():
             continue
             
         try:
-            # Length Check: 556 bytes = 1112 hex characters
-            expected_chars = (16 + NONCE_SIZE + TAG_SIZE + FIXED_PAYLOAD_SIZE) * 2
-            if len(line) < expected_chars:
-                print(f"⚠️  WARNING: Your copy looks too short! (Found {len(line)}, expected {expected_chars})")
+            # Length Check: 556 bytes = 1112 hex characters, rejected before any decoding
+            expected_chars = PACKAGE_SIZE * 2
+            if len(line) != expected_chars:
+                problem = "too short" if len(line) < expected_chars else "too long"
+                print(f"⚠️  WARNING: Your copy looks {problem}! (Found {len(line)}, expected {expected_chars})")
                 print("Make sure you copy the ENTIRE hex block from the top.")
                 continue
 
-            package = bytes.fromhex(line)
+            package = binascii.unhexlify(line)
             plaintext = ratchet.decrypt(package)
             print(f"✅ DECRYPTED: {plaintext.decode('utf-8')}")
         except Exception as e:
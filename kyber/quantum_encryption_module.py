@@ -9,15 +9,16 @@ Security Fixes:
 """
 
 import os
-import time
-import uuid
+import sys
+from hashlib import sha256
+import mmap
 import ctypes
-import json
+import time
+import struct
 import base64
+import binascii
 from typing import Optional
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import HKDF
-from Crypto.Hash import SHA256
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # OpenSSL EVP: stitched AES-NI + PCLMULQDQ
 
 # --- CONSTANTS ---
 AES_KEY_SIZE = 32
@@ -27,46 +28,194 @@ FIXED_PAYLOAD_SIZE = 512  # Every message will be EXACTLY this size + overhead
 HKDF_INFO = b"AES-GCM-256-ZERO-METADATA"
 RATCHET_INFO_CHAIN = b"RATCHET-CHAIN-KEY"
 RATCHET_INFO_MSG = b"RATCHET-MESSAGE-KEY"
+HKDF_ZERO_SALT = b"\x00" * 32  # HKDF salt=None for SHA256
+LOOKUP_INFO = b"MESSAGE-LOOKUP-ID"
+# HKDF-Expand input for a single 32-byte block: info || 0x01
+_HKDF_MSG = RATCHET_INFO_MSG + b"\x01"
+_HKDF_CHAIN = RATCHET_INFO_CHAIN + b"\x01"
+_HKDF_AESKEY = HKDF_INFO + b"\x01"
+_HKDF_LOOKUP = LOOKUP_INFO + b"\x01"
+# Hidden header: sender_len(1) + sender_id(16, zero padded) + seq(8) + timestamp(8) + message_id(8)
+# Format break: receivers that still expect the JSON header cannot read these packages.
+HEADER = struct.Struct(">B16sQQ8s")
+SENDER_ID_SIZE = 16
+MSG_ID_SIZE = 8
+FRAME = struct.Struct("<I")  # --binary mode: little-endian length prefix per package
+FRAME_OK, FRAME_ERROR = 0, 1  # --binary mode: status byte leading every output frame
+# Plaintext prefix: hdr_len(4) + HEADER + msg_len(4), written straight into the payload buffer
+CONTENT_PREFIX = struct.Struct(">I" + HEADER.format[1:] + "I")
+RAND_POOL_SIZE = 65536  # Padding, nonces and message ids are served from one getrandom per pool
 
 def secure_wipe(data: bytes):
-    """Overwrites memory of sensitive material."""
-    if not isinstance(data, (bytes, bytearray)) or len(data) == 0: return
-    try:
-        if isinstance(data, bytearray):
-            ctypes.memset(ctypes.addressof(ctypes.c_char.from_buffer(data)), 0, len(data))
-    except Exception: pass
+    """Overwrites memory of sensitive material.
+    Same-length slice assignment zeroes the buffer in place (one memcpy, no ctypes round trip)."""
+    if type(data) in (bytearray, mmap.mmap) and len(data):
+        data[:] = bytes(len(data))
+
+# libc is loaded once; None where mlock/munlock are unavailable
+try:
+    _LIBC = ctypes.CDLL(None, use_errno=True)
+    _LIBC.mlock.argtypes = _LIBC.munlock.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+except (OSError, AttributeError):
+    _LIBC = None
+
+def _buffer_address(buf) -> int:
+    ref = ctypes.c_char.from_buffer(buf)
+    addr = ctypes.addressof(ref)
+    del ref # drop the export again so the mapping can be closed later
+    return addr
+
+def locked_buffer(size: int):
+    """Returns (buf, locked): a zeroed anonymous mapping for long-lived key material.
+    The mapping owns its pages, so mlock and MADV_DONTDUMP never cover unrelated heap objects.
+    locked is False when mlock is refused (e.g. RLIMIT_MEMLOCK); the buffer works either way."""
+    buf = mmap.mmap(-1, size)
+    try: buf.madvise(mmap.MADV_DONTDUMP)
+    except (AttributeError, OSError): pass
+    locked = _LIBC is not None and _LIBC.mlock(_buffer_address(buf), size) == 0
+    return buf, locked
+
+def release_buffer(buf, locked: bool):
+    """Wipes, munlocks and unmaps a locked_buffer()."""
+    if buf.closed: return
+    secure_wipe(buf)
+    if locked: _LIBC.munlock(_buffer_address(buf), len(buf))
+    buf.close()
+
+# --- HKDF/HMAC block: must stay identical to the copy in quantum_decryption_module.py ---
+# HMAC-SHA256 (RFC 2104) is built directly on sha256: every HMAC key in the ladder is a 32-byte
+# PRK, so key XOR ipad/opad is key.translate(table) into a bytearray, absorbed into a sha256 state
+# together with the fill and wiped straight away. Each Expand copies the keyed states.
+_DIGEST_SIZE = sha256().digest_size  # 32: HMAC keys are SHA-256 PRKs, one digest long
+_BLOCK_SIZE = sha256().block_size  # 64
+_IPAD = bytes(b ^ 0x36 for b in range(256))
+_OPAD = bytes(b ^ 0x5C for b in range(256))
+_IPAD_FILL = b"\x36" * (_BLOCK_SIZE - _DIGEST_SIZE)  # ipad over the zero-padded key tail
+_OPAD_FILL = b"\x5c" * (_BLOCK_SIZE - _DIGEST_SIZE)
+# HKDF-Extract always keys HMAC with the zero salt: both pad states are constant, copy per use
+_EXTRACT_INNER = sha256(HKDF_ZERO_SALT.translate(_IPAD) + _IPAD_FILL)
+_EXTRACT_OUTER = sha256(HKDF_ZERO_SALT.translate(_OPAD) + _OPAD_FILL)
+
+def hkdf_extract(ikm: bytes) -> bytes:
+    """HKDF-Extract with salt=None, reusing the precomputed ipad/opad states."""
+    inner = _EXTRACT_INNER.copy()
+    inner.update(ikm)
+    outer = _EXTRACT_OUTER.copy()
+    outer.update(inner.digest())
+    return outer.digest()
+
+def expand_pads(prk: bytes):
+    """Returns the keyed (inner, outer) sha256 states of a 32-byte PRK, shared by every Expand under it.
+    The key XOR pad blocks only ever exist as bytearrays and are wiped before returning.
+    The fills assume a digest-sized key, so any other length is rejected."""
+    if len(prk) != _DIGEST_SIZE: raise ValueError(f"HMAC key must be {_DIGEST_SIZE} bytes")
+    key = prk if type(prk) is bytearray else bytearray(prk)
+    pad = key.translate(_IPAD)
+    inner = sha256(pad)
+    inner.update(_IPAD_FILL)
+    secure_wipe(pad)
+    pad = key.translate(_OPAD)
+    outer = sha256(pad)
+    outer.update(_OPAD_FILL)
+    secure_wipe(pad)
+    if key is not prk: secure_wipe(key)
+    return inner, outer
+
+def hkdf_expand(pads, info_block: bytes) -> bytes:
+    """First HKDF-Expand block T(1) = HMAC(prk, info || 0x01), from expand_pads(prk)."""
+    inner, outer = pads
+    inner = inner.copy()
+    inner.update(info_block)
+    outer = outer.copy()
+    outer.update(inner.digest())
+    return outer.digest()
+
+def kdf(key: bytes, context: bytes, out: int = AES_KEY_SIZE) -> bytes:
+    """Single-output key derivation (HKDF-SHA256, no salt, out <= 32 so one Expand block).
+    Must stay in sync with hkdfDerive() in src/lib/crypto.ts."""
+    prk = bytearray(hkdf_extract(key))
+    okm = hkdf_expand(expand_pads(prk), context + b"\x01")[:out]
+    secure_wipe(prk)
+    return okm
+# --- end of HKDF/HMAC block ---
+
+def ratchet_step(chain_key: bytes):
+    """One ratchet step: returns (msg_key, next_chain_key).
+    Same output as two HKDF(chain_key, 32, None, SHA256) calls, but runs HKDF-Extract once."""
+    prk = bytearray(hkdf_extract(chain_key))
+    pads = expand_pads(prk) # keyed once, shared by both Expands
+    secure_wipe(prk)
+    return hkdf_expand(pads, _HKDF_MSG), hkdf_expand(pads, _HKDF_CHAIN)
+
+def message_subkeys(msg_key: bytes):
+    """Returns (aes_key, lookup_id) for a message key from a single HKDF-Extract.
+    Same output as kdf(msg_key, HKDF_INFO) and kdf(msg_key, LOOKUP_INFO, 16)."""
+    prk = bytearray(hkdf_extract(msg_key))
+    pads = expand_pads(prk) # keyed once, shared by both Expands
+    secure_wipe(prk)
+    aes_key = bytearray(hkdf_expand(pads, _HKDF_AESKEY))
+    lookup_id = hkdf_expand(pads, _HKDF_LOOKUP)[:16]
+    return aes_key, lookup_id
+
+def gcm_encrypt(aes_key: bytes, nonce: bytes, data: bytes):
+    """AES-256-GCM seal; returns (ciphertext, tag)."""
+    sealed = AESGCM(aes_key).encrypt(nonce, data, None)
+    return sealed[:-TAG_SIZE], sealed[-TAG_SIZE:]
 
 class QuantumDoubleRatchet:
     """
     Implements a Symmetric Ratchet with support for Root Key Refreshing.
     Provides Zero-Metadata, Constant-Length (Ghost) packets.
     """
+    __slots__ = ('_key_page', '_locked', '_root_key', '_chain_key', '_step', '_sender_bytes', '_rand_pool', '_rand_off')
+
     def __init__(self, shared_secret: bytes, sender_id: str = "User"):
-        self._root_key = shared_secret
-        self._chain_key = bytearray(shared_secret)
+        # Root and chain key live in fixed 32-byte slots of one locked page and are only ever
+        # overwritten in place; the caller's buffer is copied, never modified
+        self._key_page, self._locked = locked_buffer(2 * AES_KEY_SIZE)
+        page = memoryview(self._key_page)
+        self._root_key, self._chain_key = page[:AES_KEY_SIZE], page[AES_KEY_SIZE:2*AES_KEY_SIZE]
+        self._root_key[:] = shared_secret
+        self._chain_key[:] = shared_secret
         self._step = 0
-        self._sender_id = sender_id
+        self._sender_bytes = sender_id.encode('utf-8')[:SENDER_ID_SIZE]
+        self._rand_pool = b""
+        self._rand_off = 0
+
+    def close(self):
+        """Wipes the root and chain key and unlocks/unmaps their page. The ratchet is unusable afterwards."""
+        self._root_key.release() # drop the slot views so the mapping can be closed
+        self._chain_key.release()
+        release_buffer(self._key_page, self._locked)
+
+    def __del__(self):
+        try: self.close()
+        except Exception: pass # __init__ did not finish, or interpreter shutdown
 
     def refresh_root(self, new_entropy: bytes):
         """Heals the connection for Future Secrecy."""
-        new_root = HKDF(
-            master=self._root_key + new_entropy,
-            key_len=AES_KEY_SIZE,
-            salt=None,
-            hashmod=SHA256,
-            context=b"ROOT-REFRESH"
-        )
-        secure_wipe(self._chain_key)
-        self._root_key = new_root
-        self._chain_key = bytearray(new_root)
+        ikm = bytearray(self._root_key)
+        ikm += new_entropy
+        new_root = kdf(ikm, b"ROOT-REFRESH")
+        secure_wipe(ikm)
+        self._root_key[:] = new_root
+        self._chain_key[:] = new_root
         self._step = 0
         print(f"✨ Root Key Refreshed. Connection 'Healed'.")
 
+    def _rand(self, n: int) -> bytes:
+        """Next n bytes of the os.urandom pool, refilled in bulk when it runs out.
+        Only non-secret material is drawn here: padding (encrypted), message id (encrypted), nonce (public)."""
+        off = self._rand_off
+        if off + n > len(self._rand_pool):
+            self._rand_pool = os.urandom(max(RAND_POOL_SIZE, n))
+            off = 0
+        self._rand_off = off + n
+        return self._rand_pool[off:off+n]
+
     def _advance_message_key(self) -> bytes:
-        msg_key = HKDF(self._chain_key, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_MSG)
-        new_chain = HKDF(self._chain_key, AES_KEY_SIZE, None, SHA256, context=RATCHET_INFO_CHAIN)
-        secure_wipe(self._chain_key)
-        self._chain_key = bytearray(new_chain)
+        msg_key, new_chain = ratchet_step(self._chain_key)
+        self._chain_key[:] = new_chain # overwrite in place, no new buffer per step
         self._step += 1
         return msg_key
 
@@ -75,34 +224,34 @@ class QuantumDoubleRatchet:
         Pads everything to FIXED_PAYLOAD_SIZE to hide length.
         Format: [12B Nonce] + [16B Tag] + [Encrypted(HdrLen + Hdr + MsgLen + Msg + Padding)]
         """
+        # Size check first, so a rejected message does not burn a ratchet step
+        msg_len = len(plaintext)
+        content_len = CONTENT_PREFIX.size + msg_len
+        if content_len > FIXED_PAYLOAD_SIZE:
+            raise ValueError(f"Message too large! Max payload is {FIXED_PAYLOAD_SIZE} bytes.")
+
         msg_key = self._advance_message_key()
-        
-        # 1. Prepare Hidden Header
-        header = {"s": self._sender_id, "n": self._step, "t": int(time.time()), "i": str(uuid.uuid4())[:8]}
-        header_bytes = json.dumps(header).encode('utf-8')
-        
-        # 2. Pack content: [HdrLen] + [Hdr] + [MsgLen] + [Msg]
-        msg_len = len(plaintext).to_bytes(4, 'big')
-        hdr_len = len(header_bytes).to_bytes(4, 'big')
-        content = hdr_len + header_bytes + msg_len + plaintext
+
+        # Message id, padding and nonce come from a single slice of the random pool
+        padding_needed = FIXED_PAYLOAD_SIZE - content_len
+        rand = self._rand(MSG_ID_SIZE + padding_needed + NONCE_SIZE)
+
+        # 1-2. Pack [HdrLen] + [Hidden Header] + [MsgLen] into one preallocated buffer, then [Msg]
+        content = bytearray(FIXED_PAYLOAD_SIZE)
+        sender = self._sender_bytes
+        CONTENT_PREFIX.pack_into(content, 0, HEADER.size, len(sender), sender, self._step,
+                                 int(time.time()), rand[:MSG_ID_SIZE], msg_len)
+        content[CONTENT_PREFIX.size:content_len] = plaintext
 
         # 3. Add Random Padding (The Ghost noise)
-        if len(content) > FIXED_PAYLOAD_SIZE:
-            raise ValueError(f"Message too large! Max payload is {FIXED_PAYLOAD_SIZE} bytes.")
-        
-        padding_needed = FIXED_PAYLOAD_SIZE - len(content)
-        content += os.urandom(padding_needed) # Pure random noise
+        content[content_len:] = rand[MSG_ID_SIZE:MSG_ID_SIZE+padding_needed] # Pure random noise
 
-        # 4. Encrypt everything
-        aes_key = HKDF(msg_key, AES_KEY_SIZE, None, SHA256, context=HKDF_INFO)
-        
-        # 5. Generate the BEACON (Blinded Identifier)
-        # This allows the receiver to find the key instantly without trial decryption
-        lookup_id = HKDF(msg_key, 16, None, SHA256, context=b"MESSAGE-LOOKUP-ID")
+        # 4. Derive the AES key and the BEACON (Blinded Identifier) in one pass
+        # The beacon allows the receiver to find the key instantly without trial decryption
+        aes_key, lookup_id = message_subkeys(msg_key)
         
-        nonce = os.urandom(NONCE_SIZE)
-        cipher = AES.new(aes_key, AES.MODE_GCM, nonce=nonce)
-        ciphertext, tag = cipher.encrypt_and_digest(content)
+        nonce = rand[MSG_ID_SIZE+padding_needed:]
+        ciphertext, tag = gcm_encrypt(aes_key, nonce, content)
         
         secure_wipe(aes_key)
         secure_wipe(msg_key)
@@ -115,7 +264,7 @@ def smart_load_secret(input_str: str) -> bytes:
     input_str = input_str.strip()
     try:
         if len(input_str) == 64: # Likely Hex
-            return bytes.fromhex(input_str)
+            return binascii.unhexlify(input_str)
         # Base64 for 32 bytes is 44 characters
         if len(input_str) == 44 or input_str.endswith('='):
             decoded = base64.b64decode(input_str)
@@ -123,7 +272,54 @@ def smart_load_secret(input_str: str) -> bytes:
     except Exception: pass
     raise ValueError("Invalid Key Format. Must be 32 bytes (64 Hex or 44 Base64 chars).")
 
+def read_frame(stream) -> Optional[bytes]:
+    """Reads one [4B LE length] + [payload] input frame (input frames carry no status byte).
+    Returns None only on a clean end of stream at a frame boundary; a stream that ends inside
+    a frame raises ValueError("truncated frame")."""
+    head = stream.read(FRAME.size)
+    if not head: return None
+    if len(head) < FRAME.size: raise ValueError("truncated frame")
+    (length,) = FRAME.unpack(head)
+    payload = stream.read(length)
+    if len(payload) != length: raise ValueError("truncated frame")
+    return payload
+
+def write_frame(stream, status: int, payload: bytes):
+    """Writes one [4B LE length] + [1B status] + [payload] frame and flushes it so a wrapping process can pipeline."""
+    stream.write(FRAME.pack(len(payload) + 1) + bytes((status,)))
+    stream.write(payload)
+    stream.flush()
+
+def binary_main():
+    """--binary: the first stdin line is the shared secret, then framed plaintexts in, framed packages out.
+    No hex round trip. Every input frame gets exactly one output frame, in order: FRAME_OK + package,
+    or FRAME_ERROR + UTF-8 reason (also for a truncated last frame). Human-readable status goes to stderr.
+    Input frames are [4B LE length] + [payload]; output frames add the [1B status] after the length, so
+    this output is not valid decryptor input as is: a wrapper must check and strip the status byte."""
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    try:
+        shared_secret = smart_load_secret(stdin.readline().decode('ascii'))
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return
+
+    ratchet = QuantumDoubleRatchet(shared_secret, sender_id="Antony")
+    while True:
+        try:
+            plaintext = read_frame(stdin)
+            if plaintext is None: break
+            package = ratchet.encrypt(plaintext)
+        except ValueError as e:
+            print(f"❌ FAILED: {e}", file=sys.stderr)
+            write_frame(stdout, FRAME_ERROR, str(e).encode('utf-8'))
+            continue
+        write_frame(stdout, FRAME_OK, package)
+
 def main():
+    if "--binary" in sys.argv[1:]:
+        binary_main()
+        return
+
     print("\n" + "="*60)
     print("  🔐 QUANTUM-SAFE ENCRYPTION (ZERO-METADATA)")
     print("="*60 + "\n")